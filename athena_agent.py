@@ -3,17 +3,30 @@ Strands Agent for Athena Analytics
 Deployed on Bedrock AgentCore Runtime with Gateway tools
 """
 
+from __future__ import annotations
+
+import functools
 import json
 import os
-from typing import Dict, Any
-from strands import Agent
-from strands.models.bedrock import BedrockModel
+import time
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
 from bedrock_agentcore_app import BedrockAgentCoreApp
-from bedrock_agentcore.mcp.client import MCPClient
 
-# Load gateway configuration
-with open('gateway_config.json', 'r') as f:
-    GATEWAY_CONFIG = json.load(f)
+# strands and the MCP client are imported on first use to keep cold starts short
+if TYPE_CHECKING:
+    from strands import Agent
+    from strands.models.bedrock import BedrockModel
+    from bedrock_agentcore.mcp.client import MCPClient
+
+
+@functools.lru_cache(maxsize=None)
+def get_gateway_config() -> Dict[str, Any]:
+    """
+    Load the gateway configuration on first use and cache it.
+    """
+    with open('gateway_config.json', 'r') as f:
+        return json.load(f)
+
 
 # System prompt for the analytics agent
 SYSTEM_PROMPT = """You are an intelligent data analytics assistant with access to a database through Athena queries.
@@ -34,6 +47,8 @@ Available tools:
 5. get_inventory_status - Check inventory levels at warehouses
 6. get_order_details - Get complete details for specific orders
 
+Tool results are columnar: metadata.columns lists the column names and data holds one list of values per column, in the same order. Row i is made of the i-th value of every column.
+
 When responding:
 - Be concise and data-driven
 - Format numerical results clearly (use tables when appropriate)
@@ -44,49 +59,169 @@ When responding:
 Always cite which tool you used to get the data."""
 
 
-def create_mcp_client() -> MCPClient:
+@functools.lru_cache(maxsize=None)
+def _get_mcp_client(gateway_url: str) -> MCPClient:
     """
-    Create and configure MCP client for Gateway connection.
+    Build the MCP client for a gateway URL once and reuse it.
     """
+    from bedrock_agentcore.mcp.client import MCPClient
+    
+    config = get_gateway_config()
+    
     client = MCPClient(
-        gateway_url=GATEWAY_CONFIG['gateway_url'],
-        region=GATEWAY_CONFIG['region'],
+        gateway_url=gateway_url,
+        region=config['region'],
         # Authentication will be handled by the OAuth configuration
         auth_config={
             'type': 'oauth2',
-            'client_id': GATEWAY_CONFIG['client_id'],
-            'client_secret': GATEWAY_CONFIG['client_secret'],
-            'token_endpoint': f"https://cognito-idp.{GATEWAY_CONFIG['region']}.amazonaws.com/{GATEWAY_CONFIG['user_pool_id']}/oauth2/token"
+            'client_id': config['client_id'],
+            'client_secret': config['client_secret'],
+            'token_endpoint': f"https://cognito-idp.{config['region']}.amazonaws.com/{config['user_pool_id']}/oauth2/token"
         }
     )
     
     return client
 
 
-def create_agent() -> Agent:
+def create_mcp_client() -> MCPClient:
     """
-    Create the Strands agent with Bedrock model and Gateway tools.
+    Get the shared MCP client for the Gateway connection.
+    """
+    return _get_mcp_client(get_gateway_config()['gateway_url'])
+
+
+# Tool metadata is static for a Gateway deployment, so list_tools() is cached
+TOOL_CACHE_TTL_SECONDS = 3600
+_TOOL_CACHE: Optional[list] = None
+_TOOL_CACHE_TS = 0.0
+_TOOL_COUNT = 0
+
+
+def get_gateway_tools(mcp_client: MCPClient) -> list:
+    """
+    Return the Gateway tools, calling list_tools() only when the cache is stale.
+    """
+    global _TOOL_CACHE, _TOOL_CACHE_TS, _TOOL_COUNT
+    
+    now = time.monotonic()
+    if _TOOL_CACHE is None or now - _TOOL_CACHE_TS > TOOL_CACHE_TTL_SECONDS:
+        _TOOL_CACHE = mcp_client.list_tools()
+        _TOOL_CACHE_TS = now
+        _TOOL_COUNT = len(_TOOL_CACHE)
+    
+    return _TOOL_CACHE
+
+
+# Error text that marks a rejected Gateway token
+AUTH_ERROR_MARKERS = ('401', '403', 'unauthorized', 'forbidden', 'expired')
+
+
+def is_gateway_failure(error: BaseException) -> bool:
+    """
+    Check whether an error came from a dropped connection or a rejected token.
+    """
+    while error is not None:
+        if isinstance(error, OSError):
+            return True
+        message = str(error).lower()
+        if any(marker in message for marker in AUTH_ERROR_MARKERS):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def reset_gateway_client() -> None:
     """
-    # Initialize the Bedrock model
-    model = BedrockModel(
+    Drop the cached MCP client and tools so the next request rebuilds them.
+    """
+    global _TOOL_CACHE
+    
+    _get_mcp_client.cache_clear()
+    _TOOL_CACHE = None
+
+
+# Inference defaults, overridable per request through sessionContext
+DEFAULT_MAX_TOKENS = 4096
+DEFAULT_TEMPERATURE = 0.1
+DEFAULT_LATENCY = 'standard'
+LATENCY_MODES = ('standard', 'optimized')
+
+
+def get_inference_settings(payload: Dict[str, Any]) -> Tuple[int, float, str]:
+    """
+    Read inference settings sent by the client, falling back to the defaults.
+    
+    Args:
+        payload: Request payload, settings live in its sessionContext
+        
+    Returns:
+        Tuple of max tokens, temperature and latency mode
+    """
+    session_context = payload.get('sessionContext') or {}
+    inference_config = session_context.get('inferenceConfig') or {}
+    performance_config = session_context.get('performanceConfig') or {}
+    
+    # Clamp to the ranges the model accepts
+    try:
+        max_tokens = int(inference_config.get('max_tokens', DEFAULT_MAX_TOKENS))
+        max_tokens = min(max(max_tokens, 1), DEFAULT_MAX_TOKENS)
+        temperature = float(inference_config.get('temperature', DEFAULT_TEMPERATURE))
+        temperature = min(max(temperature, 0.0), 1.0)
+    except (TypeError, ValueError):
+        max_tokens, temperature = DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE
+    
+    latency = performance_config.get('latency', DEFAULT_LATENCY)
+    if latency not in LATENCY_MODES:
+        latency = DEFAULT_LATENCY
+    
+    return max_tokens, temperature, latency
+
+
+@functools.lru_cache(maxsize=16)
+def get_model(
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    temperature: float = DEFAULT_TEMPERATURE,
+    latency: str = DEFAULT_LATENCY
+) -> BedrockModel:
+    """
+    Create the Bedrock model once per set of inference settings and reuse it.
+    """
+    from strands.models.bedrock import BedrockModel
+    
+    return BedrockModel(
         model_id='us.anthropic.claude-sonnet-4-20250514-v1:0',
         params={
-            'max_tokens': 4096,
-            'temperature': 0.1,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
             'top_p': 0.95
         },
-        region=GATEWAY_CONFIG['region'],
+        performance_config={'latency': latency},
+        region=get_gateway_config()['region'],
         read_timeout=600
     )
+
+
+def create_agent(
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    temperature: float = DEFAULT_TEMPERATURE,
+    latency: str = DEFAULT_LATENCY
+) -> Agent:
+    """
+    Create the Strands agent with Bedrock model and Gateway tools.
     
-    # Create MCP client and get tools from Gateway
+    The agent keeps conversation state, so a new one is built for every
+    invocation. Only the model and the tool list are cached.
+    """
+    from strands import Agent
+    
+    # Get MCP client and tools from Gateway
     mcp_client = create_mcp_client()
-    gateway_tools = mcp_client.list_tools()
+    gateway_tools = get_gateway_tools(mcp_client)
     
     # Create the agent
     agent = Agent(
         name='athena_analytics_agent',
-        model=model,
+        model=get_model(max_tokens, temperature, latency),
         system_prompt=SYSTEM_PROMPT,
         tools=gateway_tools,
         max_iterations=10
@@ -121,8 +256,8 @@ async def invoke(payload: Dict[str, Any], context) -> Dict[str, Any]:
                 'error': 'No prompt provided'
             }
         
-        # Create agent (cached in production)
-        agent = create_agent()
+        # Create a fresh agent so no conversation state is shared between requests
+        agent = create_agent(*get_inference_settings(payload))
         
         # Run the agent
         result = agent(prompt)
@@ -133,11 +268,15 @@ async def invoke(payload: Dict[str, Any], context) -> Dict[str, Any]:
             'result': str(result),
             'metadata': {
                 'model': 'claude-sonnet-4',
-                'tools_available': len(agent.tools)
+                'tools_available': _TOOL_COUNT
             }
         }
         
     except Exception as e:
+        # The cached client cannot recover from a dead session or bad token
+        if is_gateway_failure(e):
+            reset_gateway_client()
+        
         return {
             'status': 'error',
             'error': str(e)
@@ -1,20 +1,75 @@
+import functools
 import json
+import os
 import boto3
 import time
 import logging
-from typing import Dict, Any
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize Athena client
-athena_client = boto3.client('athena')
+# Gateway prefixes tool names with the target name and this delimiter
+TOOL_NAME_DELIMITER = "___"
+
+# Shared session and client configuration
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    connect_timeout=2,
+    read_timeout=30
+)
+_SESSION = boto3.session.Session()
 
 # Configuration
 ATHENA_DATABASE = 'your_database_name'
 ATHENA_OUTPUT_LOCATION = 's3://your-athena-results-bucket/query-results/'
 
+# Polling configuration (seconds)
+MAX_WAIT_SEC = 60
+INITIAL_POLL_DELAY = 0.1
+MIN_POLL_INTERVAL = 0.2
+MAX_POLL_INTERVAL = 2.0
+# While waiting on S3, still ask Athena for status this often (seconds) so
+# failed and cancelled queries, which never write a result object, are caught.
+# Kept well above MAX_POLL_INTERVAL so most polls are S3 HEADs, not Athena calls
+STATUS_CHECK_INTERVAL = 6.0
+
+# Result cache configuration
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '300'))
+CACHE_MAX_SIZE = 128
+
+# Per-tool TTL defaults (seconds), each can be overridden with
+# CACHE_TTL_SECONDS_<TOOL_NAME>, e.g. CACHE_TTL_SECONDS_GET_SALES_SUMMARY.
+# CACHE_TTL_SECONDS only sets the TTL for tools not listed here.
+TOOL_CACHE_TTL_SECONDS = {
+    'get_sales_summary': 3600,
+    'get_order_details': 60
+}
+
+# Athena query result reuse (minutes), per tool. The age actually used is
+# capped by the tool's cache TTL, see get_result_reuse_minutes()
+RESULT_REUSE_MAX_AGE_MINUTES = 60
+TOOL_RESULT_REUSE_MINUTES = {
+    'get_sales_summary': 60,
+    'get_inventory_status': 5,
+    'get_order_details': 1
+}
+
+# In-memory result cache, reused across invocations of a warm container
+_RESULT_CACHE: 'OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]' = OrderedDict()
+
 # Define your predefined queries
+# Values are bound through Athena execution parameters (?), LIMIT is inlined
+# as a validated integer
 PREDEFINED_QUERIES = {
     'get_sales_summary': """
         SELECT 
@@ -48,7 +103,7 @@ PREDEFINED_QUERIES = {
             SUM(total_amount) as revenue,
             AVG(unit_price) as avg_price
         FROM sales_table
-        WHERE order_date >= DATE_ADD('month', -{months}, CURRENT_DATE)
+        WHERE order_date >= DATE_ADD('month', -?, CURRENT_DATE)
         GROUP BY product_id, product_name
         ORDER BY revenue DESC
         LIMIT {limit}
@@ -61,7 +116,7 @@ PREDEFINED_QUERIES = {
             SUM(total_amount) as total_revenue,
             AVG(total_amount) as avg_order_value
         FROM sales_table
-        WHERE order_date >= DATE_ADD('month', -{months}, CURRENT_DATE)
+        WHERE order_date >= DATE_ADD('month', -?, CURRENT_DATE)
         GROUP BY region
         ORDER BY total_revenue DESC
     """,
@@ -78,7 +133,7 @@ PREDEFINED_QUERIES = {
                 ELSE 'GOOD'
             END as stock_status
         FROM inventory_table
-        WHERE warehouse_id = '{warehouse_id}'
+        WHERE warehouse_id = ?
         ORDER BY stock_status, current_stock ASC
     """,
     
@@ -94,67 +149,233 @@ PREDEFINED_QUERIES = {
             oi.unit_price
         FROM orders_table o
         JOIN order_items_table oi ON o.order_id = oi.order_id
-        WHERE o.order_id = '{order_id}'
+        WHERE o.order_id = ?
     """
 }
 
 
-def execute_athena_query(query: str) -> Dict[str, Any]:
+# Required parameters for each tool, checked before building the query
+QUERY_REQUIRED_PARAMS = {
+    'get_sales_summary': (),
+    'get_top_customers': (),
+    'get_product_performance': ('months',),
+    'get_regional_breakdown': ('months',),
+    'get_inventory_status': ('warehouse_id',),
+    'get_order_details': ('order_id',)
+}
+
+
+def _int_param(value: Any) -> str:
+    """
+    Validate a positive integer parameter and return it as an Athena literal.
+    
+    Only ints and strings of ASCII digits are accepted, so floats and bools
+    are rejected rather than silently coerced.
+    """
+    if isinstance(value, bool) or not (
+        isinstance(value, int)
+        or (isinstance(value, str) and value.isascii() and value.isdigit())
+    ):
+        raise ValueError(f'expected a positive integer, got {value!r}')
+    
+    number = int(value)
+    if number <= 0:
+        raise ValueError(f'expected a positive integer, got {number}')
+    return str(number)
+
+
+def _string_param(value: Any) -> str:
+    """
+    Quote a string parameter as an Athena literal.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# Query builders taking exactly each template's parameters, with defaults applied.
+# Each returns the query string and its execution parameters.
+_QUERY_BUILDERS = {
+    'get_sales_summary': lambda **_: (PREDEFINED_QUERIES['get_sales_summary'], []),
+    'get_top_customers': lambda limit='10', **_: (
+        PREDEFINED_QUERIES['get_top_customers'].format(limit=_int_param(limit)),
+        []
+    ),
+    'get_product_performance': lambda months, limit='20', **_: (
+        PREDEFINED_QUERIES['get_product_performance'].format(limit=_int_param(limit)),
+        [_int_param(months)]
+    ),
+    'get_regional_breakdown': lambda months, **_: (
+        PREDEFINED_QUERIES['get_regional_breakdown'],
+        [_int_param(months)]
+    ),
+    'get_inventory_status': lambda warehouse_id, **_: (
+        PREDEFINED_QUERIES['get_inventory_status'],
+        [_string_param(warehouse_id)]
+    ),
+    'get_order_details': lambda order_id, **_: (
+        PREDEFINED_QUERIES['get_order_details'],
+        [_string_param(order_id)]
+    )
+}
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> str:
+    """
+    Serialize to JSON, using orjson when it is available.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode()
+    return json.dumps(obj, sort_keys=sort_keys)
+
+
+@functools.lru_cache(maxsize=None)
+def get_athena_client():
+    """
+    Create the Athena client on first use.
+    """
+    return _SESSION.client('athena', config=BOTO_CONFIG)
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Create the S3 client on first use.
+    """
+    return _SESSION.client('s3', config=BOTO_CONFIG)
+
+
+def result_object_exists(output_location: str) -> bool:
+    """
+    Check whether Athena has written a query's result object to S3.
+    
+    Args:
+        output_location: s3:// URI from the query's ResultConfiguration
+    """
+    bucket, _, key = output_location[len('s3://'):].partition('/')
+    
+    try:
+        get_s3_client().head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError:
+        return False
+
+
+def parse_result_columns(rows: List[Dict[str, Any]], column_count: int) -> List[List[str]]:
+    """
+    Convert Athena result rows into one list of values per column.
+    
+    Args:
+        rows: Rows from a get_query_results page, without the header row
+        column_count: Number of columns in the result
+        
+    Returns:
+        List of column value lists, in column order
+    """
+    if not rows:
+        return [[] for _ in range(column_count)]
+    
+    cells = [[cell.get('VarCharValue', '') for cell in row['Data']] for row in rows]
+    return [list(values) for values in zip(*cells)]
+
+
+def execute_athena_query(
+    query: str,
+    execution_parameters: Optional[List[str]] = None,
+    reuse_max_age_minutes: int = RESULT_REUSE_MAX_AGE_MINUTES
+) -> Dict[str, Any]:
     """
     Execute an Athena query and wait for results.
     
     Args:
         query: SQL query to execute
+        execution_parameters: Literal values bound to the query's ? placeholders
+        reuse_max_age_minutes: Maximum age of previous results Athena may reuse,
+            0 disables reuse
         
     Returns:
         Dictionary containing query results
     """
+    athena_client = get_athena_client()
+    
     try:
         # Start query execution
+        execution_kwargs = {}
+        if execution_parameters:
+            execution_kwargs['ExecutionParameters'] = execution_parameters
+        
         response = athena_client.start_query_execution(
             QueryString=query,
             QueryExecutionContext={'Database': ATHENA_DATABASE},
-            ResultConfiguration={'OutputLocation': ATHENA_OUTPUT_LOCATION}
+            ResultConfiguration={'OutputLocation': ATHENA_OUTPUT_LOCATION},
+            ResultReuseConfiguration={
+                'ResultReuseByAgeConfiguration': (
+                    {'Enabled': True, 'MaxAgeInMinutes': reuse_max_age_minutes}
+                    if reuse_max_age_minutes > 0 else {'Enabled': False}
+                )
+            },
+            **execution_kwargs
         )
         
         query_execution_id = response['QueryExecutionId']
         logger.info(f"Started query execution: {query_execution_id}")
         
-        # Wait for query to complete
-        max_attempts = 60
+        # Wait for query to complete, backing off exponentially between polls
+        time.sleep(INITIAL_POLL_DELAY)
+        elapsed = INITIAL_POLL_DELAY
         attempt = 0
+        result_location = None
+        last_status_check = 0.0
         
-        while attempt < max_attempts:
-            query_status = athena_client.get_query_execution(
-                QueryExecutionId=query_execution_id
-            )
-            
-            status = query_status['QueryExecution']['Status']['State']
+        while elapsed < MAX_WAIT_SEC:
+            # Poll S3 for the result object once its location is known, and
+            # only call get_query_execution when it exists or periodically
+            if (result_location is None
+                    or elapsed - last_status_check >= STATUS_CHECK_INTERVAL
+                    or result_object_exists(result_location)):
+                query_status = athena_client.get_query_execution(
+                    QueryExecutionId=query_execution_id
+                )
+                execution = query_status['QueryExecution']
+                status = execution['Status']['State']
+                last_status_check = elapsed
+                
+                # Reused results live under the earlier query's output, so
+                # keep asking Athena directly in that case
+                reuse_info = execution.get('Statistics', {}).get('ResultReuseInformation', {})
+                if not reuse_info.get('ReusedPreviousResult'):
+                    result_location = execution.get('ResultConfiguration', {}).get('OutputLocation')
+            else:
+                status = 'RUNNING'
             
             if status == 'SUCCEEDED':
-                # Get query results
-                result = athena_client.get_query_results(
+                # Get all result pages
+                paginator = athena_client.get_paginator('get_query_results')
+                pages = paginator.paginate(
                     QueryExecutionId=query_execution_id,
-                    MaxResults=100
+                    PaginationConfig={'PageSize': 1000}
                 )
                 
-                # Parse results
-                columns = [col['Label'] for col in result['ResultSet']['ResultSetMetadata']['ColumnInfo']]
-                rows = []
+                columns = []
+                data = []
                 
-                # Skip header row
-                for row in result['ResultSet']['Rows'][1:]:
-                    row_data = {}
-                    for i, col in enumerate(columns):
-                        value = row['Data'][i].get('VarCharValue', '')
-                        row_data[col] = value
-                    rows.append(row_data)
+                for page_number, page in enumerate(pages):
+                    result_set = page['ResultSet']
+                    page_rows = result_set['Rows']
+                    
+                    if page_number == 0:
+                        columns = [col['Label'] for col in result_set['ResultSetMetadata']['ColumnInfo']]
+                        data = [[] for _ in columns]
+                        # Skip header row
+                        page_rows = page_rows[1:]
+                    
+                    # Parse results into columnar form
+                    for values, page_values in zip(data, parse_result_columns(page_rows, len(columns))):
+                        values.extend(page_values)
                 
                 return {
                     'success': True,
                     'columns': columns,
-                    'rows': rows,
-                    'row_count': len(rows)
+                    'data': data,
+                    'row_count': len(data[0]) if data else 0
                 }
                 
             elif status in ['FAILED', 'CANCELLED']:
@@ -166,7 +387,9 @@ def execute_athena_query(query: str) -> Dict[str, Any]:
                 }
             
             # Query still running, wait and retry
-            time.sleep(1)
+            delay = min(MAX_POLL_INTERVAL, MIN_POLL_INTERVAL * (2 ** attempt))
+            time.sleep(delay)
+            elapsed += delay
             attempt += 1
         
         return {
@@ -182,6 +405,55 @@ def execute_athena_query(query: str) -> Dict[str, Any]:
         }
 
 
+def get_cache_ttl(tool_name: str) -> int:
+    """
+    Return the result cache TTL for a tool, honoring environment overrides.
+    """
+    override = os.environ.get(f'CACHE_TTL_SECONDS_{tool_name.upper()}')
+    if override is not None:
+        return int(override)
+    return TOOL_CACHE_TTL_SECONDS.get(tool_name, CACHE_TTL_SECONDS)
+
+
+def get_result_reuse_minutes(tool_name: str, cache_ttl: int) -> int:
+    """
+    Return how old a reused Athena result may be for a tool, in minutes.
+    
+    Never longer than the tool's cache TTL, so a result is no staler than the
+    TTL allows. Reuse is disabled (0) for TTLs under a minute.
+    """
+    reuse_minutes = TOOL_RESULT_REUSE_MINUTES.get(tool_name, RESULT_REUSE_MAX_AGE_MINUTES)
+    return min(reuse_minutes, cache_ttl // 60)
+
+
+def get_cached_result(key: Tuple[str, str], ttl: int) -> Optional[Dict[str, Any]]:
+    """
+    Return a cached tool result if present and not expired, otherwise None.
+    """
+    entry = _RESULT_CACHE.get(key)
+    if entry is None:
+        return None
+    
+    cached_at, result = entry
+    if time.time() - cached_at >= ttl:
+        del _RESULT_CACHE[key]
+        return None
+    
+    _RESULT_CACHE.move_to_end(key)
+    return result
+
+
+def cache_result(key: Tuple[str, str], result: Dict[str, Any]) -> None:
+    """
+    Store a tool result, evicting the least recently used entry when full.
+    """
+    _RESULT_CACHE[key] = (time.time(), result)
+    _RESULT_CACHE.move_to_end(key)
+    
+    while len(_RESULT_CACHE) > CACHE_MAX_SIZE:
+        _RESULT_CACHE.popitem(last=False)
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Lambda handler for AgentCore Gateway.
@@ -196,46 +468,66 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     try:
         # Extract tool name from context
-        delimiter = "___"
         original_tool_name = context.client_context.custom['bedrockAgentCoreToolName']
-        tool_name = original_tool_name[original_tool_name.index(delimiter) + len(delimiter):]
+        tool_name = original_tool_name.rpartition(TOOL_NAME_DELIMITER)[2]
         
         logger.info(f"Processing tool: {tool_name}")
-        logger.info(f"Event parameters: {json.dumps(event)}")
+        logger.info("Event parameters: %s", dumps(event))
         
-        # Get the query template
-        if tool_name not in PREDEFINED_QUERIES:
+        # Get the query builder
+        builder = _QUERY_BUILDERS.get(tool_name)
+        if builder is None:
             return {
                 'success': False,
                 'error': f'Unknown tool: {tool_name}'
             }
         
-        query_template = PREDEFINED_QUERIES[tool_name]
+        # Serve repeated tool calls from the cache
+        cache_key = (tool_name, dumps(event, sort_keys=True))
+        cache_ttl = get_cache_ttl(tool_name)
+        cached = get_cached_result(cache_key, cache_ttl)
+        if cached is not None:
+            logger.info(f"Cache hit for tool: {tool_name}")
+            return cached
+        
+        # Validate required parameters
+        missing = [name for name in QUERY_REQUIRED_PARAMS[tool_name] if name not in event]
+        if missing:
+            return {
+                'success': False,
+                'error': f"Missing required parameter: {', '.join(missing)}"
+            }
         
-        # Format query with parameters from event
+        # Build query with parameters from event
         try:
-            query = query_template.format(**event)
-        except KeyError as e:
+            query, execution_parameters = builder(**event)
+        except (TypeError, ValueError) as e:
             return {
                 'success': False,
-                'error': f'Missing required parameter: {str(e)}'
+                'error': f'Invalid parameter: {str(e)}'
             }
         
-        logger.info(f"Executing query: {query}")
+        logger.info(f"Executing query: {query} with parameters: {execution_parameters}")
         
         # Execute the query
-        result = execute_athena_query(query)
+        result = execute_athena_query(
+            query,
+            execution_parameters,
+            get_result_reuse_minutes(tool_name, cache_ttl)
+        )
         
         # Format response for the agent
         if result['success']:
-            return {
+            response = {
                 'status': 'success',
-                'data': result['rows'],
+                'data': result['data'],
                 'metadata': {
                     'columns': result['columns'],
                     'row_count': result['row_count']
                 }
             }
+            cache_result(cache_key, response)
+            return response
         else:
             return {
                 'status': 'error',
@@ -3,21 +3,58 @@ Enhanced Gateway Configuration with AgentCore Identity
 Sets up Amazon Bedrock AgentCore Gateway with Cognito-based Identity management
 """
 
+import functools
 import json
 import boto3
-from typing import Dict, List
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
-# Initialize clients
-agentcore_client = boto3.client('bedrock-agentcore-control')
-cognito_client = boto3.client('cognito-idp')
-iam_client = boto3.client('iam')
+# Shared session and client configuration
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 3},
+    connect_timeout=2,
+    read_timeout=30
+)
+_SESSION = boto3.session.Session()
 
 # Configuration
-AWS_REGION = 'us-west-2'
+AWS_REGION = _SESSION.region_name or 'us-west-2'
+
+# Initialize clients
+agentcore_client = _SESSION.client('bedrock-agentcore-control', region_name=AWS_REGION, config=BOTO_CONFIG)
+cognito_client = _SESSION.client('cognito-idp', region_name=AWS_REGION, config=BOTO_CONFIG)
+iam_client = _SESSION.client('iam', config=BOTO_CONFIG)
 LAMBDA_FUNCTION_ARN = 'arn:aws:lambda:us-west-2:123456789012:function:athena-query-lambda'
 GATEWAY_NAME = 'athena-analytics-gateway'
 IDENTITY_NAME = 'athena-analytics-identity'
 
+# Demo users created for testing
+DEMO_USERS = [
+    {
+        'username': 'analyst@example.com',
+        'password': 'TempPass123!',
+        'name': 'Data Analyst',
+        'role': 'analyst'
+    },
+    {
+        'username': 'manager@example.com',
+        'password': 'TempPass123!',
+        'name': 'Sales Manager',
+        'role': 'manager'
+    }
+]
+DEMO_USER_MAX_WORKERS = 8
+
+
+@functools.lru_cache(maxsize=None)
+def get_account_id() -> str:
+    """
+    Look up the AWS account ID once and reuse it.
+    """
+    return _SESSION.client('sts', region_name=AWS_REGION, config=BOTO_CONFIG).get_caller_identity()['Account']
+
 
 def create_cognito_user_pool():
     """
@@ -109,61 +146,57 @@ def create_cognito_user_pool():
     }
 
 
+def create_demo_user(user_pool_id: str, user: Dict) -> Optional[Dict]:
+    """
+    Create a single demo user with a permanent password.
+    """
+    try:
+        # Create user
+        response = cognito_client.admin_create_user(
+            UserPoolId=user_pool_id,
+            Username=user['username'],
+            UserAttributes=[
+                {'Name': 'email', 'Value': user['username']},
+                {'Name': 'name', 'Value': user['name']},
+                {'Name': 'custom:role', 'Value': user['role']},
+                {'Name': 'email_verified', 'Value': 'true'}
+            ],
+            TemporaryPassword=user['password'],
+            MessageAction='SUPPRESS'
+        )
+        
+        # Set permanent password
+        cognito_client.admin_set_user_password(
+            UserPoolId=user_pool_id,
+            Username=user['username'],
+            Password=user['password'],
+            Permanent=True
+        )
+        
+        print(f"Created user: {user['username']} (role: {user['role']})")
+        
+        return {
+            'username': user['username'],
+            'password': user['password'],
+            'role': user['role']
+        }
+        
+    except Exception as e:
+        print(f"Warning: Could not create user {user['username']}: {e}")
+        return None
+
+
 def create_demo_users(user_pool_id: str):
     """
     Create demo users for testing.
     """
-    demo_users = [
-        {
-            'username': 'analyst@example.com',
-            'password': 'TempPass123!',
-            'name': 'Data Analyst',
-            'role': 'analyst'
-        },
-        {
-            'username': 'manager@example.com',
-            'password': 'TempPass123!',
-            'name': 'Sales Manager',
-            'role': 'manager'
-        }
-    ]
-    
-    created_users = []
-    
-    for user in demo_users:
-        try:
-            # Create user
-            response = cognito_client.admin_create_user(
-                UserPoolId=user_pool_id,
-                Username=user['username'],
-                UserAttributes=[
-                    {'Name': 'email', 'Value': user['username']},
-                    {'Name': 'name', 'Value': user['name']},
-                    {'Name': 'custom:role', 'Value': user['role']},
-                    {'Name': 'email_verified', 'Value': 'true'}
-                ],
-                TemporaryPassword=user['password'],
-                MessageAction='SUPPRESS'
-            )
-            
-            # Set permanent password
-            cognito_client.admin_set_user_password(
-                UserPoolId=user_pool_id,
-                Username=user['username'],
-                Password=user['password'],
-                Permanent=True
-            )
-            
-            created_users.append({
-                'username': user['username'],
-                'password': user['password'],
-                'role': user['role']
-            })
-            
-            print(f"Created user: {user['username']} (role: {user['role']})")
-            
-        except Exception as e:
-            print(f"Warning: Could not create user {user['username']}: {e}")
+    # Users are independent, so create them concurrently. Each user's two
+    # calls stay sequential, and workers are capped to stay under Cognito's
+    # admin API rate limits for larger demo sets.
+    max_workers = max(1, min(DEMO_USER_MAX_WORKERS, len(DEMO_USERS)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda user: create_demo_user(user_pool_id, user), DEMO_USERS)
+        created_users = [user for user in results if user is not None]
     
     return created_users
 
@@ -375,7 +408,7 @@ def create_identity(cognito_config: Dict, identity_role_arn: str):
         description='Identity management for Athena analytics with Cognito',
         identityConfiguration={
             'cognito': {
-                'userPoolArn': f"arn:aws:cognito-idp:{AWS_REGION}:{boto3.client('sts').get_caller_identity()['Account']}:userpool/{cognito_config['user_pool_id']}",
+                'userPoolArn': f"arn:aws:cognito-idp:{AWS_REGION}:{get_account_id()}:userpool/{cognito_config['user_pool_id']}",
                 'clientIds': [
                     cognito_config['agent_client_id'],
                     cognito_config['ui_client_id']
@@ -475,15 +508,19 @@ def main():
     cognito_config = create_cognito_user_pool()
     print(f"✓ User Pool ID: {cognito_config['user_pool_id']}")
     
-    # Step 2: Create demo users
+    # Steps 2 and 3 are independent of each other, so run them concurrently
     print("\n[2/5] Creating demo users...")
-    demo_users = create_demo_users(cognito_config['user_pool_id'])
-    print(f"✓ Created {len(demo_users)} demo users")
-    
-    # Step 3: Create IAM roles
     print("\n[3/5] Creating IAM roles...")
-    gateway_role_arn = create_gateway_iam_role()
-    identity_role_arn = create_identity_iam_role()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        demo_users_future = executor.submit(create_demo_users, cognito_config['user_pool_id'])
+        gateway_role_future = executor.submit(create_gateway_iam_role)
+        identity_role_future = executor.submit(create_identity_iam_role)
+        
+        demo_users = demo_users_future.result()
+        gateway_role_arn = gateway_role_future.result()
+        identity_role_arn = identity_role_future.result()
+    
+    print(f"✓ Created {len(demo_users)} demo users")
     print(f"✓ Gateway Role: {gateway_role_arn}")
     print(f"✓ Identity Role: {identity_role_arn}")
     
@@ -5,14 +5,25 @@ Provides user authentication via Cognito and chat interface with the agent
 
 import streamlit as st
 import boto3
+import jwt
+from botocore.config import Config
 import json
 import hmac
 import hashlib
 import base64
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+import codecs
+import collections
+import functools
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple
 import time
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
+
 # Page configuration
 st.set_page_config(
     page_title="Athena Analytics Assistant",
@@ -26,25 +37,92 @@ st.set_page_config(
 def load_config():
     """Load gateway configuration"""
     try:
-        with open('gateway_config.json', 'r') as f:
-            return json.load(f)
+        data = Path('gateway_config.json').read_bytes()
+        return orjson.loads(data) if orjson is not None else json.loads(data)
     except FileNotFoundError:
         st.error("⚠️ Configuration file not found. Please run setup_gateway_with_identity.py first.")
         st.stop()
 
 CONFIG = load_config()
 
-# Initialize Cognito client
-cognito_client = boto3.client('cognito-idp', region_name=CONFIG['region'])
-agentcore_runtime = boto3.client('bedrock-agentcore-runtime', region_name=CONFIG['region'])
+# Keep connections alive and pooled so chat turns reuse a warm TLS session
+CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=32,
+    connect_timeout=2,
+    read_timeout=60,
+    retries={'mode': 'adaptive', 'max_attempts': 5}
+)
+
+# Agent replies can pause between chunks while tools run
+AGENT_CLIENT_CONFIG = CLIENT_CONFIG.merge(Config(read_timeout=600))
+
+# AWS clients, created once per process and shared across reruns and sessions
+@st.cache_resource
+def get_cognito_client():
+    """Get the Cognito Identity Provider client"""
+    return boto3.client('cognito-idp', region_name=CONFIG['region'], config=CLIENT_CONFIG)
+
+
+@st.cache_resource
+def get_agentcore_runtime():
+    """Get the AgentCore Runtime client"""
+    return boto3.client('bedrock-agentcore-runtime', region_name=CONFIG['region'], config=AGENT_CLIENT_CONFIG)
+
+
+@st.cache_resource
+def get_initiate_auth():
+    """Get initiate_auth pre-bound to the UI app client"""
+    return functools.partial(get_cognito_client().initiate_auth, ClientId=CONFIG['ui_client_id'])
+
+
+@st.cache_resource
+def get_jwks_client():
+    """Get a JWKS client for the user pool signing keys"""
+    return jwt.PyJWKClient(f"{CONFIG['issuer_url']}/.well-known/jwks.json")
+
+
+# User attributes read from the ID token
+PROFILE_CLAIMS = ('email', 'name', 'custom:role')
+
+
+def _warm_up(cognito_client, jwks_client):
+    """Open the Cognito connection and fetch signing keys ahead of the first login"""
+    try:
+        # Any response, even access denied, leaves a warm TLS connection
+        cognito_client.describe_user_pool_client(
+            UserPoolId=CONFIG['user_pool_id'],
+            ClientId=CONFIG['ui_client_id']
+        )
+    except Exception:
+        pass
+    
+    try:
+        jwks_client.get_signing_keys()
+    except Exception:
+        pass
+
+
+@st.cache_resource
+def start_warm_up():
+    """Warm up clients on a background thread, once per process"""
+    threading.Thread(
+        target=_warm_up,
+        args=(get_cognito_client(), get_jwks_client()),
+        daemon=True
+    ).start()
+
+
+start_warm_up()
 
 
 class CognitoAuth:
     """Handle Cognito authentication"""
     
     @staticmethod
+    @functools.lru_cache(maxsize=128)
     def get_secret_hash(username: str, client_id: str, client_secret: str) -> str:
-        """Generate secret hash for Cognito"""
+        """Generate secret hash for Cognito (memoized, inputs are stable per user)"""
         message = username + client_id
         dig = hmac.new(
             client_secret.encode('utf-8'),
@@ -53,12 +131,26 @@ class CognitoAuth:
         ).digest()
         return base64.b64encode(dig).decode()
     
+    @staticmethod
+    def decode_id_token(id_token: str) -> Dict[str, Any]:
+        """Verify the ID token against the user pool keys and return its claims"""
+        signing_key = get_jwks_client().get_signing_key_from_jwt(id_token)
+        return jwt.decode(
+            id_token,
+            signing_key.key,
+            algorithms=['RS256'],
+            audience=CONFIG['ui_client_id'],
+            issuer=CONFIG['issuer_url']
+        )
+    
     @staticmethod
     def authenticate(username: str, password: str) -> Optional[Dict]:
         """
         Authenticate user with Cognito
         Returns access token and user info if successful
         """
+        cognito_client = get_cognito_client()
+        
         try:
             secret_hash = CognitoAuth.get_secret_hash(
                 username,
@@ -66,8 +158,7 @@ class CognitoAuth:
                 CONFIG['ui_client_secret']
             )
             
-            response = cognito_client.initiate_auth(
-                ClientId=CONFIG['ui_client_id'],
+            response = get_initiate_auth()(
                 AuthFlow='USER_PASSWORD_AUTH',
                 AuthParameters={
                     'USERNAME': username,
@@ -76,21 +167,29 @@ class CognitoAuth:
                 }
             )
             
-            # Get user attributes
-            user_info = cognito_client.get_user(
-                AccessToken=response['AuthenticationResult']['AccessToken']
+            # Read user attributes from the ID token claims
+            attributes = CognitoAuth.decode_id_token(
+                response['AuthenticationResult']['IdToken']
             )
             
-            # Parse user attributes
-            attributes = {attr['Name']: attr['Value'] 
-                         for attr in user_info['UserAttributes']}
+            if not all(claim in attributes for claim in PROFILE_CLAIMS):
+                # Fall back to the user API if a claim is missing
+                user_info = cognito_client.get_user(
+                    AccessToken=response['AuthenticationResult']['AccessToken']
+                )
+                attributes = {attr['Name']: attr['Value'] 
+                             for attr in user_info['UserAttributes']}
+                attributes['cognito:username'] = user_info['Username']
             
             return {
                 'access_token': response['AuthenticationResult']['AccessToken'],
                 'id_token': response['AuthenticationResult']['IdToken'],
                 'refresh_token': response['AuthenticationResult']['RefreshToken'],
                 'expires_in': response['AuthenticationResult']['ExpiresIn'],
+                'expires_at': time.monotonic() + response['AuthenticationResult']['ExpiresIn'],
                 'username': username,
+                # Pool username (sub), needed for the refresh secret hash
+                'cognito_username': attributes.get('cognito:username', username),
                 'email': attributes.get('email', ''),
                 'name': attributes.get('name', ''),
                 'role': attributes.get('custom:role', 'user')
@@ -103,28 +202,53 @@ class CognitoAuth:
             return None
     
     @staticmethod
-    def refresh_token(refresh_token: str) -> Optional[Dict]:
+    def refresh_token(refresh_token: str, cognito_username: str) -> Optional[Dict]:
         """Refresh access token"""
         try:
-            response = cognito_client.initiate_auth(
-                ClientId=CONFIG['ui_client_id'],
+            secret_hash = CognitoAuth.get_secret_hash(
+                cognito_username,
+                CONFIG['ui_client_id'],
+                CONFIG['ui_client_secret']
+            )
+            
+            response = get_initiate_auth()(
                 AuthFlow='REFRESH_TOKEN_AUTH',
                 AuthParameters={
-                    'REFRESH_TOKEN': refresh_token
+                    'REFRESH_TOKEN': refresh_token,
+                    'SECRET_HASH': secret_hash
                 }
             )
             
             return {
                 'access_token': response['AuthenticationResult']['AccessToken'],
                 'id_token': response['AuthenticationResult']['IdToken'],
-                'expires_in': response['AuthenticationResult']['ExpiresIn']
+                'expires_in': response['AuthenticationResult']['ExpiresIn'],
+                'expires_at': time.monotonic() + response['AuthenticationResult']['ExpiresIn']
             }
         except Exception:
             return None
 
 
+# Refresh tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+
+def logout(message: Optional[str] = None):
+    """Clear session state and rerun"""
+    st.session_state.clear()
+    
+    # Kept across the clear so the login page can show it
+    if message:
+        st.session_state['logout_message'] = message
+    st.rerun()
+
+
 def login_page():
     """Display login page"""
+    message = st.session_state.pop('logout_message', None)
+    if message:
+        st.toast(message, icon="⏰")
+    
     st.title("📊 Athena Analytics Assistant")
     st.markdown("---")
     
@@ -149,7 +273,12 @@ def login_page():
                             # Store in session state
                             st.session_state['authenticated'] = True
                             st.session_state['auth_data'] = auth_result
-                            st.session_state['login_time'] = datetime.now()
+                            st.session_state['login_mono'] = time.monotonic()
+                            st.session_state['profile_md'] = (
+                                f"**Name:** {auth_result['name']}\n\n"
+                                f"**Email:** {auth_result['email']}\n\n"
+                                f"**Role:** {auth_result['role'].title()}"
+                            )
                             st.rerun()
                         else:
                             st.error("❌ Invalid credentials. Please try again.")
@@ -160,9 +289,95 @@ def login_page():
                 "**Manager:** manager@example.com / TempPass123!")
 
 
-def invoke_agent(prompt: str, access_token: str) -> str:
+AGENT_ARN_MISSING = "⚠️ Agent ARN not configured. Please set it in the sidebar."
+
+# Inference defaults, shorter replies mean lower latency
+DEFAULT_MAX_TOKENS = 400
+DEFAULT_TEMPERATURE = 0.2
+DEFAULT_LATENCY = 'optimized'
+
+
+def get_inference_settings() -> Dict[str, Any]:
+    """Get inference settings chosen in the sidebar"""
+    return {
+        'max_tokens': st.session_state.get('max_tokens', DEFAULT_MAX_TOKENS),
+        'temperature': st.session_state.get('temperature', DEFAULT_TEMPERATURE)
+    }
+
+
+def iter_agent_response(
+    prompt: str,
+    access_token: str,
+    agent_arn: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    temperature: float = DEFAULT_TEMPERATURE,
+    latency: str = DEFAULT_LATENCY
+) -> Iterator[str]:
+    """
+    Invoke the deployed agent and yield response text as chunks arrive
+    """
+    response = get_agentcore_runtime().invoke_agent_runtime(
+        agentRuntimeArn=agent_arn,
+        inputText=prompt,
+        sessionContext={
+            # Pass the Cognito access token for identity verification
+            'accessToken': access_token,
+            # Inference settings read by the agent's get_inference_settings()
+            'inferenceConfig': {
+                'max_tokens': max_tokens,
+                'temperature': temperature
+            },
+            'performanceConfig': {
+                'latency': latency
+            }
+        }
+    )
+    
+    # Stream the response, decoding incrementally so multi-byte
+    # characters split across chunks are not corrupted
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    
+    for event in response['completion']:
+        if 'chunk' in event:
+            chunk = event['chunk']
+            if 'bytes' in chunk:
+                text = decoder.decode(chunk['bytes'])
+                if text:
+                    yield text
+    
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+# Flush streamed text to the UI at most every 40ms (~25 Hz) or every 16 chunks
+STREAM_FLUSH_INTERVAL = 0.04
+STREAM_FLUSH_CHUNKS = 16
+
+
+def coalesce_chunks(chunks: Iterator[str]) -> Iterator[str]:
+    """
+    Batch small chunks so the UI updates at a fixed cadence instead of per token
+    """
+    buf = []
+    last_flush = time.monotonic()
+    
+    for text in chunks:
+        buf.append(text)
+        now = time.monotonic()
+        if now - last_flush >= STREAM_FLUSH_INTERVAL or len(buf) >= STREAM_FLUSH_CHUNKS:
+            yield ''.join(buf)
+            buf.clear()
+            last_flush = now
+    
+    if buf:
+        yield ''.join(buf)
+
+
+def stream_agent(prompt: str, access_token: str) -> Iterator[str]:
     """
     Invoke the deployed agent with user's prompt
+    Yields response text in batches as chunks arrive
     """
     try:
         # The agent ARN should be loaded from config or environment
@@ -170,46 +385,97 @@ def invoke_agent(prompt: str, access_token: str) -> str:
         agent_arn = st.session_state.get('agent_arn', '')
         
         if not agent_arn:
-            return "⚠️ Agent ARN not configured. Please set it in the sidebar."
+            yield AGENT_ARN_MISSING
+            return
         
-        response = agentcore_runtime.invoke_agent_runtime(
-            agentRuntimeArn=agent_arn,
-            inputText=prompt,
-            enableTrace=False,
-            # Pass the Cognito access token for identity verification
-            sessionContext={
-                'accessToken': access_token
-            }
+        yield from coalesce_chunks(
+            iter_agent_response(prompt, access_token, agent_arn, **get_inference_settings())
         )
         
-        # Stream the response
-        event_stream = response['completion']
-        full_response = ""
-        
-        for event in event_stream:
-            if 'chunk' in event:
-                chunk = event['chunk']
-                if 'bytes' in chunk:
-                    text = chunk['bytes'].decode('utf-8')
-                    full_response += text
-        
-        return full_response
-        
     except Exception as e:
-        return f"❌ Error invoking agent: {str(e)}"
+        yield f"❌ Error invoking agent: {str(e)}"
 
 
-def chat_interface():
-    """Display chat interface"""
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_agent_response(
+    prompt: str,
+    role: str,
+    agent_arn: str,
+    max_tokens: int,
+    temperature: float,
+    _access_token: str
+) -> str:
+    """
+    Invoke the agent and cache the full response per prompt, role, agent and settings
+    Role is part of the key so per-role data visibility is respected
+    Errors are raised so they are never cached
+    """
+    return ''.join(iter_agent_response(
+        prompt,
+        _access_token,
+        agent_arn,
+        max_tokens=max_tokens,
+        temperature=temperature
+    ))
+
+
+def get_cached_response(prompt: str, auth_data: Dict) -> str:
+    """
+    Get a response for a repeated prompt, served from cache when possible
+    """
+    agent_arn = st.session_state.get('agent_arn', '')
     
-    # Sidebar
+    if not agent_arn:
+        return AGENT_ARN_MISSING
+    
+    try:
+        with st.spinner("Analyzing..."):
+            return cached_agent_response(
+                prompt,
+                auth_data['role'],
+                agent_arn,
+                _access_token=auth_data['access_token'],
+                **get_inference_settings()
+            )
+    except Exception as e:
+        return f"❌ Error invoking agent: {str(e)}"
+
+
+QUICK_QUERIES: Tuple[str, ...] = (
+    "Show me sales trends for the last 6 months",
+    "Who are our top 10 customers?",
+    "Analyze product performance for last 3 months",
+    "Compare regional sales breakdown",
+    "Check inventory for warehouse WH001",
+    "Get details for order ORD-12345"
+)
+
+
+@st.fragment(run_every='60s')
+def session_timer(login_mono: float):
+    """Display session duration, refreshed once a minute on its own"""
+    st.caption(f"Session: {int((time.monotonic() - login_mono) / 60)} minutes")
+
+
+def select_quick_query():
+    """Queue the chosen quick query and reset the selector"""
+    choice = st.session_state.get('quick_query')
+    if choice:
+        st.session_state['selected_query'] = choice
+        st.session_state['quick_query_selected'] = True
+    st.session_state['quick_query'] = None
+
+
+@st.fragment
+def render_sidebar():
+    """
+    Display the sidebar
+    Runs as a fragment so its own widgets only rerun the sidebar
+    """
     with st.sidebar:
         st.title("👤 User Profile")
-        auth_data = st.session_state['auth_data']
         
-        st.info(f"**Name:** {auth_data['name']}\n\n"
-                f"**Email:** {auth_data['email']}\n\n"
-                f"**Role:** {auth_data['role'].title()}")
+        st.info(st.session_state['profile_md'])
         
         st.markdown("---")
         
@@ -223,54 +489,100 @@ def chat_interface():
         )
         st.session_state['agent_arn'] = agent_arn
         
+        # Inference settings
+        st.slider(
+            "Max response tokens",
+            min_value=100,
+            max_value=4096,
+            value=DEFAULT_MAX_TOKENS,
+            step=50,
+            key='max_tokens',
+            help="Lower values return shorter, faster answers"
+        )
+        st.slider(
+            "Temperature",
+            min_value=0.0,
+            max_value=1.0,
+            value=DEFAULT_TEMPERATURE,
+            step=0.05,
+            key='temperature'
+        )
+        
         st.markdown("---")
         
         # Quick queries
-        st.subheader("💡 Quick Queries")
-        
-        quick_queries = [
-            "Show me sales trends for the last 6 months",
-            "Who are our top 10 customers?",
-            "Analyze product performance for last 3 months",
-            "Compare regional sales breakdown",
-            "Check inventory for warehouse WH001",
-            "Get details for order ORD-12345"
-        ]
+        st.pills(
+            "💡 Quick Queries",
+            options=QUICK_QUERIES,
+            selection_mode='single',
+            default=None,
+            key='quick_query',
+            on_change=select_quick_query
+        )
         
-        for query in quick_queries:
-            if st.button(query, key=query, use_container_width=True):
-                st.session_state['selected_query'] = query
+        if st.session_state.pop('quick_query_selected', False):
+            # The chat area lives outside this fragment
+            st.rerun()
         
         st.markdown("---")
         
         # Session info
-        login_time = st.session_state.get('login_time', datetime.now())
-        session_duration = datetime.now() - login_time
-        st.caption(f"Session: {int(session_duration.total_seconds() / 60)} minutes")
+        session_timer(st.session_state.get('login_mono', time.monotonic()))
         
         if st.button("🚪 Logout", use_container_width=True):
-            # Clear session state
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            st.rerun()
+            logout()
+
+
+# Number of chat messages kept in the session
+MAX_CHAT_MESSAGES = 50
+
+
+def render_history(messages: Iterable[Dict]):
+    """Display past chat messages, redrawn on every full rerun"""
+    for message in messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+def render_stream(chunks: Iterator[str]) -> str:
+    """
+    Render streamed text into a single placeholder, returns the full text
+    """
+    placeholder = st.empty()
+    response = ''
+    
+    for text in chunks:
+        response += text
+        placeholder.markdown(response)
+    
+    return response
+
+
+def chat_interface():
+    """Display chat interface"""
+    auth_data = st.session_state['auth_data']
+    
+    # Sidebar
+    render_sidebar()
     
     # Main chat area
     st.title("💬 Athena Analytics Chat")
     st.markdown("Ask questions about your data and get AI-powered insights!")
     
-    # Initialize chat history
+    # Initialize chat history, capped to bound memory and render cost
     if 'messages' not in st.session_state:
-        st.session_state['messages'] = [
-            {
-                "role": "assistant",
-                "content": f"Hello {auth_data['name']}! 👋 I'm your Athena Analytics Assistant. I can help you analyze sales data, customer insights, product performance, and more. What would you like to know?"
-            }
-        ]
+        st.session_state['messages'] = collections.deque(
+            [
+                {
+                    "role": "assistant",
+                    "content": f"Hello {auth_data['name']}! 👋 I'm your Athena Analytics Assistant. I can help you analyze sales data, customer insights, product performance, and more. What would you like to know?"
+                }
+            ],
+            maxlen=MAX_CHAT_MESSAGES
+        )
     
     # Display chat messages
-    for message in st.session_state['messages']:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    render_history(st.session_state['messages'])
     
     # Check for selected quick query
     if 'selected_query' in st.session_state:
@@ -288,9 +600,13 @@ def chat_interface():
         
         # Get agent response
         with st.chat_message("assistant"):
-            with st.spinner("Analyzing..."):
-                response = invoke_agent(prompt, auth_data['access_token'])
+            if prompt in QUICK_QUERIES:
+                # Quick queries repeat across users, serve them from cache
+                response = get_cached_response(prompt, auth_data)
                 st.markdown(response)
+            else:
+                # Free-form questions always go to the agent, streamed
+                response = render_stream(stream_agent(prompt, auth_data['access_token']))
         
         # Add assistant response to chat
         st.session_state['messages'].append({"role": "assistant", "content": response})
@@ -303,23 +619,18 @@ def main():
     if 'authenticated' not in st.session_state or not st.session_state['authenticated']:
         login_page()
     else:
-        # Check if token needs refresh
-        login_time = st.session_state.get('login_time', datetime.now())
-        if datetime.now() - login_time > timedelta(minutes=50):  # Refresh before 1 hour
-            auth_data = st.session_state['auth_data']
-            new_tokens = CognitoAuth.refresh_token(auth_data['refresh_token'])
+        # Refresh tokens shortly before they expire
+        auth_data = st.session_state['auth_data']
+        if time.monotonic() > auth_data['expires_at'] - TOKEN_REFRESH_MARGIN:
+            new_tokens = CognitoAuth.refresh_token(
+                auth_data['refresh_token'],
+                auth_data['cognito_username']
+            )
             
             if new_tokens:
                 auth_data.update(new_tokens)
-                st.session_state['auth_data'] = auth_data
-                st.session_state['login_time'] = datetime.now()
             else:
-                # Refresh failed, logout
-                st.error("Session expired. Please login again.")
-                time.sleep(2)
-                for key in list(st.session_state.keys()):
-                    del st.session_state[key]
-                st.rerun()
+                logout("Session expired. Please login again.")
         
         chat_interface()
 